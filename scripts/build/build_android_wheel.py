@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 import os
+import functools
 import json
 import shutil
 import subprocess
@@ -9,11 +10,16 @@ import sys
 import urllib.request
 from pathlib import Path
 
-import tomllib
-from shutil import which
 import urllib.error
 import tomli_w
 
+from build_utils import load_pyproject, which
+
+
+# Snapshot of the inherited environment, taken once per process. Build steps
+# overlay their own variables on top of it instead of re-copying os.environ,
+# which set_github_env() mutates as the build progresses.
+_BASE_ENV = dict(os.environ)
 
 
 def create_cargo_config(project_path: Path, target_triplet: str, python_lib_dir: Path):
@@ -43,9 +49,14 @@ def create_cargo_config(project_path: Path, target_triplet: str, python_lib_dir:
     }
 
     config_path = cargo_dir / "config.toml"
-    with open(config_path, "wb") as f:
-        tomli_w.dump(config_data, f)
-    
+    config_bytes = tomli_w.dumps(config_data).encode("utf-8")
+    # The existing file doubles as the "already patched" marker on cached checkouts.
+    if config_path.is_file() and config_path.read_bytes() == config_bytes:
+        print(f"{config_path} is already up to date; skipping.")
+        return
+
+    config_path.write_bytes(config_bytes)
+
     print(f"Created {config_path} with linker and direct rustflags for python lib.")
 
 
@@ -54,17 +65,19 @@ def run(cmd, **kwargs):
     return subprocess.run(cmd, check=True, **kwargs)
 
 
-def set_github_env(name: str, value: str):
-    """Sets an environment variable for subsequent steps in a GitHub Actions job."""
-    os.environ[name] = value
+def set_github_env(env: dict[str, str]):
+    """Sets environment variables for subsequent steps in a GitHub Actions job, in one append."""
+    os.environ.update(env)
 
     github_env = os.getenv("GITHUB_ENV")
     if github_env:
         with open(github_env, "a") as f:
-            f.write(f"{name}={value}\n")
-        print(f"Env var set in $GITHUB_ENV: {name}={value}", flush=True)
+            f.write("".join(f"{name}={value}\n" for name, value in env.items()))
+        for name, value in env.items():
+            print(f"Env var set in $GITHUB_ENV: {name}={value}", flush=True)
     else:
-        print(f"Warning: GITHUB_ENV not found. Cannot set env var {name}.", file=sys.stderr, flush=True)
+        for name in env:
+            print(f"Warning: GITHUB_ENV not found. Cannot set env var {name}.", file=sys.stderr, flush=True)
 
 
 
@@ -204,78 +217,86 @@ def setup_python_cross_build(
     print(f"Found pre-built Python lib dir: {lib_dir}", flush=True)
     return lib_dir
 
-def prepare_build_environment(ndk_path: Path, target_triplet: str, android_api: str, python_version, python_lib_dir: Path) -> dict[str, str]:
-    """Prepares the environment variables for cross-compilation."""
-    print("--- Preparing cross-compilation environment ---", flush=True)
-    toolchain = ndk_path / "toolchains" / "llvm" / "prebuilt" / "linux-x86_64"
-    # env = os.environ.copy()
-    env = {}
-
-    # Add NDK toolchain to PATH for auto-discovery by rustc and other tools
+@functools.lru_cache(maxsize=16)
+def compute_cross_env(ndk_path_str: str, target_triplet: str, android_api: str) -> dict[str, str]:
+    """Computes the cross-compilation variables for one NDK/target/API combination."""
+    toolchain = Path(ndk_path_str) / "toolchains" / "llvm" / "prebuilt" / "linux-x86_64"
     toolchain_bin = toolchain / "bin"
-    env["PATH"] = f'{toolchain_bin}:{os.environ['PATH']}'
+    sysroot_flags = f"--sysroot={toolchain}/sysroot"
 
-    # Set compiler env vars for C/C++ build scripts (e.g. in dependencies).
-    # Since the toolchain bin is in the PATH, we can just use the names.
-    env["CC"] = str(toolchain_bin / f"{target_triplet}{android_api}-clang")
-    env["CXX"] = str(toolchain_bin / f"{target_triplet}{android_api}-clang++")
-    env["AR"] = str(toolchain_bin / "llvm-ar")
+    env = {
+        # Add NDK toolchain to PATH for auto-discovery by rustc and other tools
+        "PATH": f'{toolchain_bin}:{_BASE_ENV['PATH']}',
+        # Set compiler env vars for C/C++ build scripts (e.g. in dependencies).
+        # Since the toolchain bin is in the PATH, we can just use the names.
+        "CC": str(toolchain_bin / f"{target_triplet}{android_api}-clang"),
+        "CXX": str(toolchain_bin / f"{target_triplet}{android_api}-clang++"),
+        "AR": str(toolchain_bin / "llvm-ar"),
+        # Set sysroot flags for the C/C++ compilers
+        "CFLAGS": sysroot_flags,
+        "LDFLAGS": sysroot_flags,
+        "CARGO_BUILD_TARGET": target_triplet,
+        # Release builds never benefit from incremental state; keep it off explicitly.
+        "CARGO_INCREMENTAL": "0",
+        "PYO3_CROSS": "1",
+        # "PYO3_CROSS_PYTHON_VERSION": python_version,
+        # "PYO3_CROSS_LIB_DIR": str(python_lib_dir),
+    }
 
-    # Set sysroot flags for the C/C++ compilers
-    sysroot_flags = f"--sysroot={toolchain}/sysroot"
-    env["CFLAGS"] = sysroot_flags
-    env["LDFLAGS"] = sysroot_flags
+    # Opt-in (FAST_BUILD=1): trade some runtime speed of the wheel for parallel
+    # LLVM codegen. Overrides the project's [profile.release] via cargo's env config.
+    if _BASE_ENV.get("FAST_BUILD") == "1":
+        env |= {
+            "CARGO_PROFILE_RELEASE_CODEGEN_UNITS": "256",
+            "CARGO_PROFILE_RELEASE_LTO": "off",
+        }
 
-    env["CARGO_BUILD_TARGET"] = target_triplet
+    return env
 
-    env["PYO3_CROSS"] = "1"
-    # env["PYO3_CROSS_PYTHON_VERSION"] = python_version
-    # env["PYO3_CROSS_LIB_DIR"] = str(python_lib_dir)
 
+def prepare_build_environment(ndk_path: Path, target_triplet: str, android_api: str, python_version, python_lib_dir: Path) -> dict[str, str]:
+    """Prepares the environment variables for cross-compilation."""
+    print("--- Preparing cross-compilation environment ---", flush=True)
+    # Copy so callers can't mutate the cached overlay.
+    env = dict(compute_cross_env(str(ndk_path), target_triplet, android_api))
 
-    for k,v in env.items():
-        set_github_env(k, v)
+    set_github_env(env)
 
     print("Prepared build environment variables.", flush=True)
     return env
 
 
-def ensure_maturin_venv(project_path: Path) -> Path:
+def get_maturin() -> Path:
     """
-    Ensures maturin is installed using pipx.
-    Returns a dummy venv path and the path to the maturin executable.
+    Returns the path to a maturin executable.
+    Reuses one already on PATH; otherwise installs it once per host as a
+    global tool with uv (bootstrapping uv itself via pip if needed).
     """
-    print("--- Ensuring maturin is installed via pipx ---", flush=True)
+    print("--- Ensuring maturin is available ---", flush=True)
 
-    if not which("pipx"):
-        raise RuntimeError("pipx is not installed or not in PATH. Please install pipx to continue.")
-
-    # Check if maturin is already installed by pipx
-    result = subprocess.run(["pipx", "list", "--json"], capture_output=True, text=True)
-    maturin_installed = False
-    if result.returncode == 0:
-        try:
-            pipx_list = json.loads(result.stdout)
-            if "maturin" in pipx_list["venvs"]:
-                maturin_installed = True
-                print("maturin is already installed by pipx.", flush=True)
-        except (json.JSONDecodeError, KeyError):
-            print("Warning: Could not parse pipx list output. Assuming maturin is not installed.", flush=True)
-
-    if not maturin_installed:
-        print("Installing maturin with pipx...", flush=True)
-        run(["pipx", "install", "maturin>=1,<2"])
-
-    # Get maturin path
     maturin_path_str = which("maturin")
+    if maturin_path_str:
+        print("maturin is already on PATH.", flush=True)
+    else:
+        uv_path_str = which("uv")
+        if uv_path_str:
+            uv_cmd = [uv_path_str]
+        else:
+            print("uv is not installed; installing it with pip...", flush=True)
+            run([sys.executable, "-m", "pip", "install", "uv"])
+            # The uv wheel is runnable as a module, so we don't depend on its script dir being on PATH.
+            uv_cmd = [sys.executable, "-m", "uv"]
+
+        print("Installing maturin with uv...", flush=True)
+        run([*uv_cmd, "tool", "install", "--force", "maturin>=1,<2"])
+        which.cache_clear()
+        maturin_path_str = which("maturin")
+
     if not maturin_path_str:
-        raise RuntimeError("Failed to find maturin even after pipx installation.")
+        raise RuntimeError("Failed to find maturin even after installation.")
 
     maturin_path = Path(maturin_path_str)
     print(f"Using maturin at: {maturin_path}", flush=True)
-
-    # The first element of the tuple (venv_path) is not used by the caller.
-    # We return the project_path as a placeholder.
     return maturin_path
 
 
@@ -298,7 +319,7 @@ def build_wheel(
     if not pyproject_path.is_file():
         raise ValueError("此构建脚本仅适用于基于 maturin 的项目（需要 pyproject.toml 且 build-backend = 'maturin'）。")
 
-    pyproject = tomllib.loads(pyproject_path.read_text(encoding="utf-8"))
+    pyproject = load_pyproject(pyproject_path)
     build_system = pyproject.get("build-system", {})
     backend = build_system.get("build-backend", "")
 
@@ -307,7 +328,7 @@ def build_wheel(
         raise ValueError("检测到非 maturin 后端；此脚本当前仅支持 maturin。" )
 
     # maturin
-    maturin_exe = ensure_maturin_venv(project_path)
+    maturin_exe = get_maturin()
 
     # rust target
     run(["rustup", "target", "add", target_triplet], cwd=project_path)
@@ -326,7 +347,7 @@ def build_wheel(
         "--auditwheel", "skip", # Android不需要修复轮子
         "-i", interpreter_cli,
     ]
-    run(build_cmd, env=build_env, cwd=project_path)
+    run(build_cmd, env=_BASE_ENV | build_env, cwd=project_path)
 
     return True
 
@@ -354,7 +375,8 @@ def process_wheel(
     if not wheel_files:
         raise FileNotFoundError(f"No wheel files found after build. Searched in: {search_path}")
 
-    wheel_path = sorted(wheel_files, key=lambda p: p.stat().st_mtime, reverse=True)[0]
+    # Newest wheel wins; one stat per candidate and no sort needed to pick it.
+    wheel_path = max(wheel_files, key=lambda p: p.stat().st_mtime)
     print(f"Found wheel: {wheel_path}", flush=True)
 
     normalized_lib_name = library_name.replace("-", "_")
@@ -380,8 +402,25 @@ def process_wheel(
     output_dir = Path.cwd() / "output"
     output_dir.mkdir(parents=True, exist_ok=True)
     final_wheel_path = output_dir / new_wheel_name
-    shutil.move(str(wheel_path), final_wheel_path)
-    print(f"Moved wheel to: {final_wheel_path}", flush=True)
+    # Hardlink instead of copying: the wheel stays addressable under both names
+    # without duplicating its bytes. Leaving the original in target/wheels (or dist)
+    # is intended; re-runs on a kept checkout accumulate old wheels there, and the
+    # newest-mtime pick above is what keeps them from being chosen.
+    # A stale output/ entry from an earlier run is replaced by a fresh link; fall back
+    # to a move if links aren't possible.
+    try:
+        os.link(wheel_path, final_wheel_path)
+        print(f"Linked wheel to: {final_wheel_path}", flush=True)
+    except FileExistsError:
+        if os.path.samefile(wheel_path, final_wheel_path):
+            print(f"Wheel already linked at: {final_wheel_path}", flush=True)
+        else:
+            final_wheel_path.unlink()
+            os.link(wheel_path, final_wheel_path)
+            print(f"Relinked wheel to: {final_wheel_path}", flush=True)
+    except OSError:
+        shutil.move(str(wheel_path), final_wheel_path)
+        print(f"Moved wheel to: {final_wheel_path}", flush=True)
 
 
 def main():
@@ -0,0 +1,40 @@
+import functools
+import os
+import shutil
+
+@functools.lru_cache(maxsize=None)
+def _tomllib():
+    """
+    Imports the TOML reader on first use, so callers that never parse
+    (e.g. check_backend.py's regex fast path) don't pay for the import.
+    """
+    try:
+        import tomllib
+    except ImportError:
+        # This script runs in a controlled environment (Python 3.11+),
+        # so this should ideally not happen.
+        import tomli as tomllib
+    return tomllib
+
+
+@functools.lru_cache(maxsize=32)
+def _load_pyproject_cached(path_str: str, mtime_ns: int) -> dict:
+    with open(path_str, "rb") as f:
+        return _tomllib().load(f)
+
+
+def load_pyproject(path: str | os.PathLike) -> dict:
+    """
+    Parses a pyproject.toml, cached per (path, mtime) so an unchanged file is
+    only parsed once per process. The returned dict is shared; treat it as read-only.
+    """
+    return _load_pyproject_cached(os.fspath(path), os.stat(path).st_mtime_ns)
+
+
+@functools.lru_cache(maxsize=None)
+def which(name: str) -> str | None:
+    """
+    shutil.which, memoized for the process. Call which.cache_clear() after
+    installing a tool so the next lookup sees it.
+    """
+    return shutil.which(name)
@@ -1,49 +1,159 @@
 #!/usr/bin/env python3
 
+import functools
+import mmap
+import os
+import re
 import sys
-from pathlib import Path
-
-def get_build_backend(project_path: Path) -> str:
-    """Reads pyproject.toml and returns the build backend."""
-    # 递归查找pyproject.toml文件
-    pyproject_files = list(project_path.rglob("pyproject.toml"))
-
-    if not pyproject_files:
-        # 如果没有找到pyproject.toml，查找setup.py
-        setup_files = list(project_path.rglob("setup.py"))
-        if not setup_files:
-            print("No pyproject.toml or setup.py found, assuming setuptools", file=sys.stderr)
-            return "setuptools"
-        # 使用setup.py的目录
-        pyproject_path = setup_files[0]
-        print(f"Found setup.py at: {pyproject_path}", file=sys.stderr)
-        return "setuptools"
+from collections import deque
+
+from build_utils import load_pyproject
+
+# VCS metadata, virtualenvs, caches and build output; a pyproject.toml in here belongs
+# to a dependency or an artifact, never to the project being built.
+SKIP_DIRS = frozenset({
+    ".git", ".hg", ".svn", "node_modules", ".venv", "venv", "env", ".build_venv", "__pycache__",
+    "build", "dist", ".tox", "target", ".mypy_cache", ".pytest_cache", ".ruff_cache", "site-packages",
+})
+# Real projects keep their pyproject.toml within a few levels of the checkout root.
+MAX_SEARCH_DEPTH = 4
+# Files at least this large are scanned in place through mmap instead of read into memory.
+MMAP_MIN_SIZE = 4096
+
+# CHECK_BACKEND_LOG=DEBUG turns on the "Found ... at" diagnostics on stderr.
+_DEBUG = os.environ.get("CHECK_BACKEND_LOG", "WARNING").upper() == "DEBUG"
+
+_BUILD_SYSTEM_HEADER_RE = re.compile(rb"(?m)^\[build-system\][ \t]*(?:#[^\n]*)?\r?$")
+# Single-line quoted value only; escapes, multi-line strings etc. are left to tomllib.
+_BUILD_BACKEND_RE = re.compile(rb"""(?m)^[ \t]*build-backend[ \t]*=[ \t]*(["'])([^"'\\\n]+)\1""")
+
+def _debug(msg: str, *args):
+    """Writes a %-style diagnostic to stderr; nothing is formatted unless _DEBUG is set."""
+    if _DEBUG:
+        print(msg % args, file=sys.stderr)
 
-    # 使用找到的第一个pyproject.toml文件
-    pyproject_path = pyproject_files[0]
-    print(f"Found pyproject.toml at: {pyproject_path}", file=sys.stderr)
+def _find_first(root: str, names: tuple[str, ...], depth: int = 0) -> tuple[int, int, str] | None:
+    """
+    Walks root breadth-first with os.scandir for the shallowest file named names[0].
+    Later names are fallbacks, kept only when no earlier name exists anywhere in the tree.
+    SKIP_DIRS are pruned and nothing deeper than MAX_SEARCH_DEPTH is visited; depth is
+    root's own depth below the checkout. Returns (rank, depth, path) of the best hit.
+    Directories that vanish or can't be read are skipped, as rglob did.
+    """
+    best = None
+    queue = deque([(root, depth)])
+    while queue:
+        dir_path, dir_depth = queue.popleft()
+        try:
+            with os.scandir(dir_path) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        if dir_depth < MAX_SEARCH_DEPTH and entry.name not in SKIP_DIRS:
+                            queue.append((entry.path, dir_depth + 1))
+                    elif entry.name in names:
+                        rank = names.index(entry.name)
+                        if rank == 0:
+                            return rank, dir_depth, entry.path
+                        if best is None or rank < best[0]:
+                            best = rank, dir_depth, entry.path
+        except OSError:
+            continue
+    return best
 
+def _search_tree(project_path: str, names: tuple[str, ...]) -> str | None:
+    """
+    Runs _find_first over each top-level subdirectory, in parallel when there are several.
+    The best (rank, depth) hit wins, ties going to the earlier subdirectory, so the answer
+    doesn't depend on which thread finishes first.
+    """
     try:
-        import tomllib
-    except ImportError:
-        # This script runs in a controlled environment (Python 3.11+),
-        # so this should ideally not happen.
-        import tomli as tomllib
+        with os.scandir(project_path) as it:
+            subdirs = [e.path for e in it if e.is_dir(follow_symlinks=False) and e.name not in SKIP_DIRS]
+    except OSError:
+        # Missing or unreadable project path: report "not found" and let the caller assume setuptools
+        return None
+
+    search = functools.partial(_find_first, names=names, depth=1)
+    if len(subdirs) > 1:
+        # Imported here: it pulls in logging and threading, which the root fast path never needs
+        from concurrent.futures import ThreadPoolExecutor
+
+        # scandir releases the GIL, so the subtree walks overlap their syscalls
+        with ThreadPoolExecutor(max_workers=min(8, len(subdirs))) as executor:
+            hits = list(executor.map(search, subdirs))
+    else:
+        hits = [search(d) for d in subdirs]
+
+    best = min((h for h in hits if h), key=lambda h: h[:2], default=None)
+    return best[2] if best else None
+
+def _scan_backend(data) -> str | None:
+    """Regex scan behind _extract_backend_fast; data is bytes or an mmap over the file."""
+    header = _BUILD_SYSTEM_HEADER_RE.search(data)
+    if not header:
+        return None
+
+    # [build-system] ends at the next table header
+    end = data.find(b"\n[", header.end())
+    section = data[header.end():end if end != -1 else len(data)]
+    match = _BUILD_BACKEND_RE.search(section)
+    if not match:
+        return None
+    return match.group(2).decode("utf-8")
 
-    pyproject_content = tomllib.loads(pyproject_path.read_text())
+def _extract_backend_fast(path: str) -> str | None:
+    """
+    Pulls build-system.build-backend out of a pyproject.toml without a full TOML parse.
+    Returns None for anything it can't read with confidence; callers then parse the file.
+    """
+    with open(path, "rb") as f:
+        # Mapping costs more than a single read() for the usual few-hundred-byte file
+        if os.fstat(f.fileno()).st_size < MMAP_MIN_SIZE:
+            return _scan_backend(f.read())
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return _scan_backend(mm)
+
+@functools.lru_cache(maxsize=128)
+def get_build_backend(project_path_str: str) -> str:
+    """
+    Reads pyproject.toml and returns the build backend.
+    Cached per path string, so repeat lookups in one process skip the walk; callers that
+    may spell the same tree differently should normalize it (os.path.abspath) first.
+    """
+    # 绝大多数项目的pyproject.toml/setup.py就在根目录，先直接检查，无需遍历
+    project_file = os.path.join(project_path_str, "pyproject.toml")
+    if not os.path.isfile(project_file):
+        project_file = os.path.join(project_path_str, "setup.py")
+    if not os.path.isfile(project_file):
+        # 根目录没有，再递归查找pyproject.toml文件，找不到时退回到setup.py（一次遍历）
+        project_file = _search_tree(project_path_str, ("pyproject.toml", "setup.py"))
+
+    if project_file is None:
+        print("No pyproject.toml or setup.py found, assuming setuptools", file=sys.stderr)
+        return "setuptools"
+
+    if os.path.basename(project_file) == "setup.py":
+        _debug("Found setup.py at: %s", project_file)
+        return "setuptools"
+
+    pyproject_path = project_file
+    _debug("Found pyproject.toml at: %s", pyproject_path)
+
+    # 只需要build-backend一个值，能直接扫描出来就不做完整的TOML解析
+    backend = _extract_backend_fast(pyproject_path)
+    if backend is not None:
+        return backend
+
+    pyproject_content = load_pyproject(pyproject_path)
     build_system = pyproject_content.get("build-system", {})
     backend = build_system.get("build-backend", "setuptools") # Default to setuptools
 
     return backend
 
-def main():
+if __name__ == "__main__":
     if len(sys.argv) != 2:
-        print("Usage: python check_backend.py <project_path>", file=sys.stderr)
-        sys.exit(1)
+        # SystemExit with a str prints it to stderr and exits with status 1
+        raise SystemExit("Usage: python check_backend.py <project_path>")
 
-    project_path = Path(sys.argv[1])
-    backend = get_build_backend(project_path)
-    print(backend)
-
-if __name__ == "__main__":
-    main()
+    # One raw write to fd 1: the workflows capture exactly this line via $(...)
+    os.write(1, get_build_backend(sys.argv[1]).encode("utf-8") + b"\n")
@@ -1,19 +1,61 @@
 import os
 import sys
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-import tomllib
+
+try:
+    import tomllib
+except ImportError:
+    # Python < 3.11 has no stdlib TOML reader.
+    import tomli as tomllib
 import tomli_w
 
+# Build output, VCS metadata and virtualenvs never hold a project we need to convert.
+SKIP_DIRS = frozenset({".git", "target", ".build_venv", ".venv", "node_modules", "__pycache__", "dist", "build"})
+
+LICENSE_CLASSIFIER_PREFIX = "License ::"
+
+# A workspace root sits a level or two above its members; don't climb to / looking for one.
+WORKSPACE_SEARCH_DEPTH = 8
+
+# (name, value) pairs queued for $GITHUB_ENV until flush_github_env() runs.
+_PENDING_ENV: list[tuple[str, str]] = []
+
 def set_github_actions_env_variable(name: str, value: str):
-    """Sets an environment variable for subsequent steps in a GitHub Actions job."""
+    """Queues an environment variable for subsequent steps in a GitHub Actions job."""
+    _PENDING_ENV.append((name, value))
+
+def flush_github_env():
+    """Writes every queued environment variable to $GITHUB_ENV in a single append."""
+    if not _PENDING_ENV:
+        return
     github_env = os.getenv("GITHUB_ENV")
     if github_env:
         with open(github_env, "a") as f:
-            f.write(f"{name}={value}\n")
-        print(f"Successfully set environment variable: {name}={value}")
+            f.write("".join(f"{name}={value}\n" for name, value in _PENDING_ENV))
+        for name, value in _PENDING_ENV:
+            print(f"Successfully set environment variable: {name}={value}")
     else:
-        print(f"Warning: GITHUB_ENV not found. Cannot set environment variable {name}.", file=sys.stderr)
-        print(f"Would set {name}={value}")
+        for name, value in _PENDING_ENV:
+            print(f"Warning: GITHUB_ENV not found. Cannot set environment variable {name}.", file=sys.stderr)
+            print(f"Would set {name}={value}")
+    _PENDING_ENV.clear()
+
+def write_toml(path: Path, data: dict):
+    """
+    Writes TOML via a temporary sibling file and an atomic rename over the original.
+    The document is serialized up front so the temp file gets a single write.
+    """
+    tmp_path = path.with_suffix(".toml.tmp")
+    tmp_path.write_bytes(tomli_w.dumps(data).encode("utf-8"))
+    os.replace(tmp_path, path)
+
+def _ensure(table: dict, *keys: str) -> dict:
+    """Returns the nested table at keys, creating any missing levels along the way."""
+    for key in keys:
+        table = table.setdefault(key, {})
+    return table
 
 def normalize_pyproject_toml_for_pep621(pyproject: dict):
     """Normalizes the pyproject.toml to comply with modern PEP standards for setuptools."""
@@ -31,18 +73,18 @@ def normalize_pyproject_toml_for_pep621(pyproject: dict):
     # PEP 639: If a license expression is used, remove legacy license classifiers
     if "license" in project_table and "classifiers" in project_table:
         original_classifiers = project_table["classifiers"]
-        project_table["classifiers"] = [
-            c for c in original_classifiers if not c.startswith("License ::")
-        ]
-        if len(original_classifiers) > len(project_table["classifiers"]):
+        kept_classifiers = [c for c in original_classifiers if not c.startswith(LICENSE_CLASSIFIER_PREFIX)]
+        if len(kept_classifiers) != len(original_classifiers):
+            project_table["classifiers"] = kept_classifiers
             print("Removed legacy 'License ::' classifiers for PEP 639 compliance.")
 
-def normalize_cargo_toml_for_setuptools_rust(cargo_path: Path):
-    """Ensures Cargo.toml is compatible with setuptools-rust's default behavior."""
+def normalize_cargo_toml_for_setuptools_rust(cargo_path: Path, cargo_toml: dict) -> dict:
+    """
+    Ensures Cargo.toml is compatible with setuptools-rust's default behavior.
+    Updates the already-parsed cargo_toml in place and only writes it back when changed.
+    Returns the (possibly updated) Cargo.toml.
+    """
     print(f"Normalizing Cargo.toml at: {cargo_path}")
-    with open(cargo_path, "rb") as f:
-        cargo_toml = tomllib.load(f)
-
     dependencies = cargo_toml.get("dependencies", {})
     has_direct_pyo3 = "pyo3" in dependencies
     has_pyo3_ffi = "pyo3-ffi" in dependencies
@@ -63,7 +105,7 @@ def normalize_cargo_toml_for_setuptools_rust(cargo_path: Path):
 
         if not pyo3_version:
             print("Warning: Could not determine version for pyo3-ffi, cannot add pyo3 dependency.", file=sys.stderr)
-            return
+            return cargo_toml
 
         # Add a pyo3 dependency that carries the feature, but doesn't enable default features
         cargo_toml["dependencies"]["pyo3"] = {
@@ -79,9 +121,10 @@ def normalize_cargo_toml_for_setuptools_rust(cargo_path: Path):
             ]
             print("Removed 'extension-module' feature from 'pyo3-ffi' dependency.")
 
-        with open(cargo_path, "wb") as f:
-            tomli_w.dump(cargo_toml, f)
-            print("Successfully wrote updated Cargo.toml.")
+        write_toml(cargo_path, cargo_toml)
+        print("Successfully wrote updated Cargo.toml.")
+
+    return cargo_toml
 
 def find_python_package_info(project_path: Path, pyproject: dict) -> tuple[str, str]:
     """
@@ -93,9 +136,14 @@ def find_python_package_info(project_path: Path, pyproject: dict) -> tuple[str,
     if "python-source" in maturin_config:
         source_dir = maturin_config["python-source"]
         pysrc_path = project_path / source_dir
-        packages = [p.name for p in pysrc_path.iterdir() if p.is_dir() and (p / "__init__.py").exists()]
-        if packages:
-            return packages[0], source_dir
+        # DirEntry.is_dir() answers from the readdir data, so only the __init__.py probe stats.
+        with os.scandir(pysrc_path) as it:
+            package_name = next(
+                (e.name for e in it if e.is_dir() and os.path.exists(os.path.join(e.path, "__init__.py"))),
+                None,
+            )
+        if package_name:
+            return package_name, source_dir
     
     project_name = pyproject.get("project", {}).get("name")
     if project_name:
@@ -103,11 +151,8 @@ def find_python_package_info(project_path: Path, pyproject: dict) -> tuple[str,
 
     raise FileNotFoundError("Could not find Python package information.")
 
-def get_cargo_version(cargo_path: Path) -> str | None:
-    """Gets the version from a Cargo.toml, supporting workspaces."""
-    with open(cargo_path, "rb") as f:
-        cargo_toml = tomllib.load(f)
-
+def get_cargo_version(cargo_path: Path, cargo_toml: dict) -> str | None:
+    """Gets the version from a parsed Cargo.toml, supporting workspaces."""
     package_table = cargo_toml.get("package", {})
     version_field = package_table.get("version")
 
@@ -120,12 +165,15 @@ def get_cargo_version(cargo_path: Path) -> str | None:
         print("Version is in workspace. Searching for root Cargo.toml...")
         current_dir = cargo_path.parent
         # Search upwards for a Cargo.toml that defines the workspace
-        while current_dir != current_dir.parent:
+        for _ in range(WORKSPACE_SEARCH_DEPTH):
+            if current_dir == current_dir.parent:
+                break
             root_cargo_path = current_dir / "Cargo.toml"
             if root_cargo_path.is_file():
-                with open(root_cargo_path, "rb") as rf:
-                    root_cargo_toml = tomllib.load(rf)
-                if "workspace" in root_cargo_toml:
+                data = root_cargo_path.read_bytes()
+                # Member manifests never open a [workspace] table; only parse the ones that do
+                if b"[workspace" in data:
+                    root_cargo_toml = tomllib.loads(data.decode("utf-8"))
                     workspace_version = root_cargo_toml.get("workspace", {}).get("package", {}).get("version")
                     if workspace_version:
                         print(f"Found workspace version {workspace_version} in {root_cargo_path}")
@@ -135,21 +183,43 @@ def get_cargo_version(cargo_path: Path) -> str | None:
     # 3. If neither is found, return None
     return None
 
-def convert_project(pyproject_path: Path):
-    """Converts a single project defined by a pyproject.toml file."""
+def get_crate_name(cargo_toml: dict) -> str:
+    """Returns the Rust library name from [lib].name in a parsed Cargo.toml."""
+    crate_name = cargo_toml.get("lib", {}).get("name")
+    if not crate_name:
+        raise ValueError("Could not find [lib].name in Cargo.toml")
+    print(f"Found Rust crate name: '{crate_name}'")
+    return crate_name
+
+def convert_project(pyproject_path: Path) -> list[tuple[str, str]]:
+    """
+    Converts a single project defined by a pyproject.toml file.
+    Returns the (name, value) environment variables later build steps need; the caller
+    exports them, so parallel workers never write $GITHUB_ENV themselves.
+    """
+    env_updates = []
     project_path = pyproject_path.parent
     cargo_path = project_path / "Cargo.toml"
 
-    if not cargo_path.is_file():
-        print(f"Warning: Cargo.toml not found in {project_path}, skipping conversion for {pyproject_path}", file=sys.stderr)
-        return
+    # Sniff before anything else: already-converted and non-maturin projects can't
+    # mention maturin as their backend, so they need neither a parse nor a Cargo.toml.
+    raw = pyproject_path.read_bytes()
+    if b"maturin" not in raw:
+        print(f"Project at {project_path} is not using maturin. No conversion needed.", file=sys.stderr)
+        return env_updates
 
-    with open(pyproject_path, "rb") as f:
-        pyproject = tomllib.load(f)
+    pyproject = tomllib.loads(raw.decode("utf-8"))
 
     if pyproject.get("build-system", {}).get("build-backend") != "maturin":
         print(f"Project at {project_path} is not using maturin. No conversion needed.", file=sys.stderr)
-        return
+        return env_updates
+
+    if not cargo_path.is_file():
+        print(f"Warning: Cargo.toml not found in {project_path}, skipping conversion for {pyproject_path}", file=sys.stderr)
+        return env_updates
+
+    with open(cargo_path, "rb") as f:
+        cargo_toml = tomllib.load(f)
 
     print(f"---")
     print(f"Converting project at: {project_path}")
@@ -157,9 +227,9 @@ def convert_project(pyproject_path: Path):
     # Step 1: Handle dynamic version before any conversion
     if "version" in pyproject.get("project", {}).get("dynamic", []):
         print("Dynamic version detected. Setting SETUPTOOLS_SCM_PRETEND_VERSION from Cargo.toml...")
-        cargo_version = get_cargo_version(cargo_path)
+        cargo_version = get_cargo_version(cargo_path, cargo_toml)
         if cargo_version:
-            set_github_actions_env_variable("SETUPTOOLS_SCM_PRETEND_VERSION", cargo_version)
+            env_updates.append(("SETUPTOOLS_SCM_PRETEND_VERSION", cargo_version))
         else:
             print("Warning: Could not find version in Cargo.toml to set environment variable.", file=sys.stderr)
 
@@ -167,22 +237,18 @@ def convert_project(pyproject_path: Path):
     normalize_pyproject_toml_for_pep621(pyproject)
     
     # Step 3: Normalize Cargo.toml for setuptools-rust compatibility
-    normalize_cargo_toml_for_setuptools_rust(cargo_path)
+    cargo_toml = normalize_cargo_toml_for_setuptools_rust(cargo_path, cargo_toml)
 
     maturin_config = pyproject.get("tool", {}).get("maturin", {})
     package_name, source_dir = find_python_package_info(project_path, pyproject)
     print(f"Found Python package '{package_name}' in source directory '{source_dir}'")
 
-    with open(cargo_path, "rb") as f:
-        cargo_toml = tomllib.load(f)
-    crate_name = cargo_toml.get("lib", {}).get("name")
-    if not crate_name:
-        raise ValueError("Could not find [lib].name in Cargo.toml")
-    print(f"Found Rust crate name: '{crate_name}'")
+    # [tool] always ends up populated (Step 8 adds setuptools-rust), so create it once.
+    tool = pyproject.setdefault("tool", {})
 
     # Step 4: Remove [tool.maturin]
-    if "maturin" in pyproject.get("tool", {}):
-        del pyproject["tool"]["maturin"]
+    if "maturin" in tool:
+        del tool["maturin"]
         print("Removed [tool.maturin] section.")
 
     # Step 5: Update [build-system]
@@ -192,16 +258,11 @@ def convert_project(pyproject_path: Path):
 
     # Step 6: Handle dynamic fields in pyproject.toml
     if "dynamic" in pyproject.get("project", {}):
-        if "tool" not in pyproject:
-            pyproject["tool"] = {}
-        if "setuptools" not in pyproject["tool"]:
-            pyproject["tool"]["setuptools"] = {}
-        if "dynamic" not in pyproject["tool"]["setuptools"]:
-            pyproject["tool"]["setuptools"]["dynamic"] = {}
+        setuptools_dynamic = _ensure(tool, "setuptools", "dynamic")
 
         for field in pyproject["project"]["dynamic"]:
             if field == "readme":
-                pyproject["tool"]["setuptools"]["dynamic"]["readme"] = {
+                setuptools_dynamic["readme"] = {
                     "file": ["README.md"],
                     "content-type": "text/markdown"
                 }
@@ -209,37 +270,48 @@ def convert_project(pyproject_path: Path):
 
     # Step 7: Add [tool.setuptools.packages.find] for multi-module projects
     if source_dir != ".":
-        if "tool" not in pyproject:
-            pyproject["tool"] = {}
-        if "setuptools" not in pyproject["tool"]:
-            pyproject["tool"]["setuptools"] = {}
-        pyproject["tool"]["setuptools"]["packages"] = {"find": {"where": [source_dir]}}
+        _ensure(tool, "setuptools")["packages"] = {"find": {"where": [source_dir]}}
         print(f"Added [tool.setuptools.packages.find] with where=['{source_dir}'].")
 
     # Step 8: Add [[tool.setuptools-rust.ext-modules]]
+    # The crate name is only needed when maturin's module-name doesn't spell out the target.
     if "module-name" in maturin_config:
         target = maturin_config["module-name"]
     elif source_dir == ".":
-        target = crate_name
+        target = get_crate_name(cargo_toml)
     else:
-        target = f"{package_name}.{crate_name}"
+        target = f"{package_name}.{get_crate_name(cargo_toml)}"
 
     ext_module = {
         "target": target,
         "path": "Cargo.toml",
         "binding": "PyO3"
     }
-    if "tool" not in pyproject:
-        pyproject["tool"] = {}
-    if "setuptools-rust" not in pyproject["tool"]:
-        pyproject["tool"]["setuptools-rust"] = {}
-    pyproject["tool"]["setuptools-rust"]["ext-modules"] = [ext_module]
+    _ensure(tool, "setuptools-rust")["ext-modules"] = [ext_module]
     print(f"Added [[tool.setuptools-rust.ext-modules]] with target '{ext_module['target']}'.")
 
-    with open(pyproject_path, "wb") as f:
-        tomli_w.dump(pyproject, f)
+    write_toml(pyproject_path, pyproject)
 
     print(f"Successfully updated {pyproject_path}")
+    return env_updates
+
+def find_pyprojects(root: Path) -> Iterator[Path]:
+    """
+    Yields every pyproject.toml under root, without descending into SKIP_DIRS.
+    Directories that are missing or can't be read are skipped, as rglob did.
+    """
+    stack = [str(root)]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in SKIP_DIRS:
+                            stack.append(entry.path)
+                    elif entry.name == "pyproject.toml":
+                        yield Path(entry.path)
+        except OSError:
+            continue
 
 def main():
     if len(sys.argv) != 2:
@@ -248,7 +320,8 @@ def main():
 
     project_path = Path(sys.argv[1]).resolve()
     
-    pyproject_files = list(project_path.rglob("pyproject.toml"))
+    # Materialized for the count and the worker sizing below.
+    pyproject_files = list(find_pyprojects(project_path))
 
     if not pyproject_files:
         print(f"Error: No pyproject.toml found in {project_path}", file=sys.stderr)
@@ -256,8 +329,36 @@ def main():
 
     print(f"Found {len(pyproject_files)} pyproject.toml file(s). Converting...")
 
-    for pyproject_path in pyproject_files:
-        convert_project(pyproject_path)
+    # Each conversion only touches files under its own project directory.
+    max_workers = min(os.cpu_count() or 1, len(pyproject_files))
+    # One failed project must not cost the others their exports: every outcome is
+    # collected, what succeeded is exported, and only then is the first error re-raised.
+    env_updates = []
+    errors = []
+    if max_workers == 1:
+        # The usual single-project checkout: spawning a pool would cost more than the conversion.
+        for pyproject_path in pyproject_files:
+            try:
+                env_updates.extend(convert_project(pyproject_path))
+            except Exception as e:
+                errors.append(e)
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(convert_project, pyproject_path) for pyproject_path in pyproject_files]
+            # Walked in discovery order so the exports keep a stable order.
+            for future in futures:
+                try:
+                    env_updates.extend(future.result())
+                except Exception as e:
+                    errors.append(e)
+
+    for name, value in env_updates:
+        set_github_actions_env_variable(name, value)
+    flush_github_env()
+
+    if errors:
+        print(f"Error: {len(errors)} of {len(pyproject_files)} conversion(s) failed.", file=sys.stderr)
+        raise errors[0]
 
     print("\nConversion complete!")
 
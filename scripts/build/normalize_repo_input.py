@@ -1,11 +1,14 @@
 import sys
 import re
 
+_GH_PREFIX_RE = re.compile(r"^https?://github\.com/", re.IGNORECASE)
+_GIT_SUFFIX_RE = re.compile(r"\.git$")
+
 def normalize_repo_input(repo_input:str) -> str:
     # Remove https://github.com/ or http://github.com/ prefix if present
-    repo = re.sub(r"^(https?://github\.com/)", "", repo_input, flags=re.IGNORECASE)
+    repo = _GH_PREFIX_RE.sub("", repo_input)
     # Remove .git suffix if present
-    repo = re.sub(r"\.git$", "", repo)
+    repo = _GIT_SUFFIX_RE.sub("", repo)
     return repo
 
 if __name__ == "__main__":
@@ -1,3 +1,4 @@
+import os
 import shutil
 from collections import defaultdict
 from pathlib import Path
@@ -5,15 +6,25 @@ import re
 from datetime import datetime, timezone
 import subprocess
 import sys
+from functools import lru_cache
+from operator import attrgetter
+
+_REMOTE_OWNER_REPO_RE = re.compile(r'(?:[:/])([^/]+/[^/]+?)(?:\.git)?$')
+_PEP503_RE = re.compile(r"[-_.]+")
 
 def get_github_repo_url():
     """
     Determines the GitHub repository's base URL for raw file access.
     e.g., https://github.com/owner/repo/raw/wheels
     """
+    # On GitHub Actions the owner/repo is already in the environment
+    gh_repo = os.environ.get("GITHUB_REPOSITORY")
+    if gh_repo:
+        return f"https://github.com/{gh_repo}/raw/wheels"
+
     try:
         remote_url = subprocess.check_output(['git', 'remote', 'get-url', 'origin']).decode('utf-8').strip()
-        match = re.search(r'(?:[:/])([^/]+/[^/]+?)(?:\.git)?$', remote_url)
+        match = _REMOTE_OWNER_REPO_RE.search(remote_url)
         if match:
             owner_repo = match.group(1)
             # Assuming the wheels are in a branch named 'wheels'
@@ -24,59 +35,111 @@ def get_github_repo_url():
         print("Could not get git remote URL. Make sure you are in a git repository.")
         return None
 
-def get_git_last_modified(file_path: Path) -> datetime:
+@lru_cache(maxsize=None)
+def get_git_last_modified(file_path_str: str) -> datetime:
     """
     Gets the last commit date of a file from git log.
     Returns a fallback datetime if git log fails.
+    Memoized, since each wheel is looked up by both the root and the package page.
     """
     try:
         # Use --follow to track renames, get committer date in ISO 8601 format
         iso_date_str = subprocess.check_output(
-            ['git', 'log', '-1', '--pretty=format:%cI', '--follow', '--', str(file_path)]
+            ['git', 'log', '-1', '--pretty=format:%cI', '--follow', '--', file_path_str]
         ).decode('utf-8').strip()
         return datetime.fromisoformat(iso_date_str)
     except (subprocess.CalledProcessError, FileNotFoundError, ValueError) as e:
-        print(f"Warning: Could not get git last modified date for {file_path}: {e}", file=sys.stderr)
+        print(f"Warning: Could not get git last modified date for {file_path_str}: {e}", file=sys.stderr)
         # Fallback to a known old date to avoid showing current time
         return datetime.fromtimestamp(0, tz=timezone.utc)
 
+def build_mtime_map() -> dict[str, datetime]:
+    """
+    Maps every path in the history to its last commit date, using a single
+    `git log` walk instead of one subprocess per wheel.
+    """
+    mtime_map = {}
+    try:
+        log_output = subprocess.check_output(
+            ['git', '-c', 'core.quotePath=false', 'log', '--pretty=format:COMMIT %cI', '--name-only']
+        ).decode('utf-8')
+    except (subprocess.CalledProcessError, FileNotFoundError) as e:
+        print(f"Warning: Could not read git log: {e}", file=sys.stderr)
+        return mtime_map
+
+    commit_date = None
+    for line in log_output.splitlines():
+        if line.startswith("COMMIT "):
+            commit_date = datetime.fromisoformat(line[len("COMMIT "):])
+        elif line and commit_date is not None:
+            # git log is newest-first, so the first date seen for a path is its latest
+            mtime_map.setdefault(line, commit_date)
+    return mtime_map
+
+def get_last_modified(wheel_path: str, mtime_map) -> datetime:
+    """
+    Looks a wheel's posix-style relative path up in the mtime map,
+    falling back to a per-file git log on a miss.
+    """
+    last_modified = mtime_map.get(wheel_path)
+    if last_modified is None:
+        last_modified = get_git_last_modified(wheel_path)
+    return last_modified
+
 def normalize_for_pep503(name):
     """Applies PEP 503 normalization to a project name."""
-    return re.sub(r"[-_.]+", "-", name).lower()
-
-def generate_root_html_lines(packages):
-    """Generator for the root index.html content."""
-    yield "<!DOCTYPE html>\n"
-    yield "<html>\n"
-    yield "<body>\n"
-    yield "  <table>\n"
-    for name in sorted(packages.keys()):
+    return _PEP503_RE.sub("-", name).lower()
+
+def generate_root_html(sorted_names, packages, mtime_map) -> str:
+    """Builds the root index.html content. sorted_names gives the row order."""
+    parts = ["<!DOCTYPE html>\n<html>\n<body>\n  <table>\n"]
+    for name in sorted_names:
         wheel_files = packages[name]
-        latest_date = max(get_git_last_modified(wheel) for wheel in wheel_files)
-        yield f'    <tr>\n'
-        yield f'      <td><a href="{name}/">{name}</a></td>\n'
-        yield f'      <td>{latest_date.strftime("%Y-%m-%d %H:%M:%S %Z")}</td>\n'
-        yield f'    </tr>\n'
-    yield "  </table>\n"
-    yield "</body>\n"
-    yield "</html>\n"
-
-def generate_pkg_html_lines(wheel_files, repo_base_url):
-    """Generator for a package's index.html content."""
-    yield "<!DOCTYPE html>\n"
-    yield "<html>\n"
-    yield "<body>\n"
-    yield "  <table>\n"
-    for wheel in sorted(wheel_files, key=lambda f: f.name):
-        last_modified = get_git_last_modified(wheel)
-        wheel_url = f"{repo_base_url}/{wheel.as_posix()}"
-        yield f'    <tr>\n'
-        yield f'      <td><a href="{wheel_url}">{wheel.name}</a></td>\n'
-        yield f'      <td>{last_modified.strftime("%Y-%m-%d %H:%M:%S %Z")}</td>\n'
-        yield f'    </tr>\n'
-    yield "  </table>\n"
-    yield "</body>\n"
-    yield "</html>\n"
+        latest_date = max(get_last_modified(wheel.as_posix(), mtime_map) for wheel in wheel_files)
+        parts.append(
+            f'    <tr>\n'
+            f'      <td><a href="{name}/">{name}</a></td>\n'
+            f'      <td>{latest_date.isoformat(sep=" ", timespec="seconds")}</td>\n'
+            f'    </tr>\n'
+        )
+    parts.append("  </table>\n</body>\n</html>\n")
+    return "".join(parts)
+
+def generate_pkg_html(wheel_files, repo_base_url, mtime_map) -> str:
+    """Builds a package's index.html content. wheel_files must already be sorted by name."""
+    parts = ["<!DOCTYPE html>\n<html>\n<body>\n  <table>\n"]
+    url_prefix = repo_base_url + "/"
+    for wheel in wheel_files:
+        # Computed once per wheel and shared by the date lookup and the link
+        wheel_path = wheel.as_posix()
+        last_modified = get_last_modified(wheel_path, mtime_map)
+        wheel_url = url_prefix + wheel_path
+        parts.append(
+            f'    <tr>\n'
+            f'      <td><a href="{wheel_url}">{wheel.name}</a></td>\n'
+            f'      <td>{last_modified.isoformat(sep=" ", timespec="seconds")}</td>\n'
+            f'    </tr>\n'
+        )
+    parts.append("  </table>\n</body>\n</html>\n")
+    return "".join(parts)
+
+def iter_wheels(root: Path):
+    """
+    Yields every .whl under root from a single scandir pass, skipping .git.
+    Directories that vanish or can't be read are skipped, as rglob did.
+    """
+    stack = [str(root)]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name != ".git":
+                            stack.append(entry.path)
+                    elif entry.name.endswith(".whl"):
+                        yield Path(entry.path)
+        except OSError:
+            continue
 
 def main():
     # Determine the base URL for wheel links
@@ -92,38 +155,40 @@ def main():
 
     # Find all wheel files from the 'wheels' branch checkout
     wheels_root = Path(".")
-    all_wheels = list(wheels_root.glob("**/*.whl"))
+    all_wheels = list(iter_wheels(wheels_root))
 
     # Group wheels by their PEP 503 normalized project name
     packages = defaultdict(list)
     for wheel in all_wheels:
-        try:
-            # Use the parent directory name as the project name if available (and not root)
-            # This supports the structure where wheels are organized in package-named folders
-            if wheel.parent != wheels_root:
-                project_name_from_file = wheel.parent.name
-            else:
-                project_name_from_file = wheel.name.split("-")[0]
-
-            normalized_name = normalize_for_pep503(project_name_from_file)
-            packages[normalized_name].append(wheel)
-        except IndexError:
-            print(f"Could not parse package name from {wheel.name}")
+        # Use the parent directory name as the project name if available (and not root)
+        # This supports the structure where wheels are organized in package-named folders
+        if wheel.parent != wheels_root:
+            project_name_from_file = wheel.parent.name
+        else:
+            project_name_from_file = wheel.name.partition("-")[0]
+
+        normalized_name = normalize_for_pep503(project_name_from_file)
+        packages[normalized_name].append(wheel)
 
     if not packages:
         print("No wheels found. Exiting.")
         (public_dir / "index.html").write_text("<!DOCTYPE html><html><body>No wheels found.</body></html>")
     else:
-        # Create the root index file using a generator
-        with open(public_dir / "index.html", "w", encoding="utf-8") as f:
-            f.writelines(generate_root_html_lines(packages))
+        # Sort once up front; the generators consume these lists as-is.
+        for wheel_files in packages.values():
+            wheel_files.sort(key=attrgetter("name"))
+        sorted_names = sorted(packages)
+
+        mtime_map = build_mtime_map()
+
+        # Create the root index file in a single write
+        (public_dir / "index.html").write_text(generate_root_html(sorted_names, packages, mtime_map), encoding="utf-8")
 
         # Create a directory and index file for each package
         for name, wheel_files in packages.items():
             pkg_dir = public_dir / name
             pkg_dir.mkdir(exist_ok=True)
-            with open(pkg_dir / "index.html", "w", encoding="utf-8") as f:
-                f.writelines(generate_pkg_html_lines(wheel_files, repo_base_url))
+            (pkg_dir / "index.html").write_text(generate_pkg_html(wheel_files, repo_base_url, mtime_map), encoding="utf-8")
 
     print(f"Generated index for {len(packages)} packages.")
 